@@ -39,6 +39,8 @@ client = runparts["client"]
 # Get all the struct utilities from the client
 struct_utils = client.utility().struct
 clone = struct_utils.clone
+compile_spec = struct_utils.compile_spec
+compile_validator = struct_utils.compile_validator
 delprop = struct_utils.delprop
 escre = struct_utils.escre
 escurl = struct_utils.escurl
@@ -200,6 +202,10 @@ class TestStruct(unittest.TestCase):
         self.assertEqual(x, xc)
         self.assertIsNot(x, xc)
 
+        # Map keys become strings, as in JSON.
+        self.assertEqual(clone({1: "a", 2.5: [{None: True}], False: 0}),
+                         {"1": "a", "2.5": [{"null": True}], "false": 0})
+
     def test_minor_edge_items(self):
         a0 = [11, 22, 33]
         self.assertEqual(items(a0), [['0', 11], ['1', 22], ['2', 33]])
@@ -382,6 +388,34 @@ class TestStruct(unittest.TestCase):
 
         runset(walkSpec["basic"], walk_wrapper)
 
+    def test_walk_paths(self):
+        # Each callback gets its own path, which can be kept.
+        paths = []
+        walk({"a": {"b": 1}, "c": [2]}, lambda k, v, p, path: paths.append(path) or v)
+        self.assertEqual(paths, [["a", "b"], ["a"], ["c", "0"], ["c"], []])
+
+        paths = []
+        keep = lambda k, v, p, path: paths.append(path) or v
+        walk({"a": {"b": 1}}, before=keep, after=keep)
+        self.assertEqual(paths, [[], ["a"], ["a", "b"], ["a", "b"], ["a"], []])
+
+    def test_walk_writeback(self):
+        # Only new values are written back into their parent.
+        class Counted(dict):
+            sets = 0
+
+            def __setitem__(self, key, val):
+                Counted.sets += 1
+                dict.__setitem__(self, key, val)
+
+        data = Counted(a=Counted(b=1), c=[1])
+        walk(data, lambda k, v, p, path: v)
+        self.assertEqual(Counted.sets, 0)
+
+        walk(data, lambda k, v, p, path: v + 1 if isinstance(v, int) else v)
+        self.assertEqual(Counted.sets, 1)
+        self.assertEqual(data, {"a": {"b": 2}, "c": [2]})
+
     def test_walk_copy(self):
         cur = [None]
 
@@ -461,6 +495,21 @@ class TestStruct(unittest.TestCase):
         self.assertEqual(merge([[f0]]), [f0])
         self.assertEqual(merge([{"a": {"b": f0}}]), {"a": {"b": f0}})
 
+    def test_merge_self(self):
+        # A target that is also a source child is merged as a copy.
+        x = {"c": 1}
+        self.assertEqual(merge([x, {"a": x, "b": 2}]), {"c": 1, "a": {"c": 1}, "b": 2})
+        self.assertEqual(validate({"a": {}}, ['`$ONE`', '`a`']), {"a": {}})
+
+    def test_merge_invalid_keys(self):
+        # Invalid keys are skipped, as with setprop.
+        self.assertEqual(merge([{}, {"": 1}]), {})
+        self.assertEqual(merge([{"a": 1}, {"": {"b": 1}, "c": 2}]), {"a": 1, "c": 2})
+
+        # A node already held under an invalid key is merged in place.
+        self.assertEqual(merge([{"": {"x": 1}}, {"": {"y": 2}}]), {"": {"x": 1, "y": 2}})
+        self.assertEqual(merge([{"": {"x": 1}}, {"": 3}]), {"": {"x": 1}})
+
         
     # -------------------------------------------------
     # getpath tests
@@ -642,6 +691,12 @@ class TestStruct(unittest.TestCase):
         self.assertEqual(transform({"a": 1}, {"x": "`a`"}), {"x": 1})
         self.assertEqual(transform({"f0": f0}, {"x": "`f0`"}), {"x": f0})
 
+    def test_transform_data_keys(self):
+        # Data map keys are converted to strings, and empty keys dropped.
+        self.assertEqual(transform({1: "a", "b": 2}, {"x": "`b`", "y": "`1`"}),
+                         {"x": 2, "y": "a"})
+        self.assertEqual(validate({"": {}}, {"$x": 1}), {"$x": 1})
+
     # -------------------------------------------------
     # validate tests
     # -------------------------------------------------
@@ -711,6 +766,135 @@ class TestStruct(unittest.TestCase):
         self.assertEqual(out, {"a": "A"})
         self.assertEqual(errs, ["Not an integer at a: A"])
 
+    def test_compile(self):
+        # A compiled spec, reused for each data value, gives the same
+        # results and key order as a one-shot transform or validate.
+        # Specs are not changed by compiling or by the calls. The one-shot
+        # validate is given meta, so it always runs the full transform,
+        # rather than the direct checks used for plain specs.
+        def fullvalidate(data, shape):
+            return validate(data, shape, {"meta": {}})
+
+        OPEN = '`$OPEN`'
+        cases = [
+            (compile_spec, transform,
+             {"x": "`a`", "y": ["`$EACH`", "b", {"z": "`$COPY`"}]},
+             [{"a": 1, "b": [{"z": 2}]}, {"a": 3, "b": []}]),
+            (compile_spec, transform,
+             {"x": "$foo", "y": "`a.b`", "z": "p`a.b`q"},
+             [{"a": {"b": 1}}, {}]),
+            (compile_validator, fullvalidate,
+             {"a": "`$STRING`", "b": 1},
+             [{"a": "A"}, {"a": "B", "b": 2}, {"a": 1}, {"a": "C"}]),
+            (compile_validator, fullvalidate,
+             {"a": "`$STRING`", "b": {"c": 1, "d": "`$LIST`"}, "e": "`$ANY`"},
+             [{"a": "A", "b": {"d": [{"x": 1}]}},
+              {"a": "A", "b": {"d": [1, None]}, "e": None},
+              {"a": "A", "b": {"c": "C", "d": []}},
+              {"a": "A", "b": {"d": []}, "e": {"z": 1, "b": 2}}]),
+            (compile_validator, fullvalidate,
+             {"a": "$foo"}, [{"a": "bar"}, {}]),
+            (compile_validator, fullvalidate,
+             {"a": "a$", "b": 1}, [{"a": "bar"}, {"b": 2}]),
+            (compile_validator, fullvalidate,
+             {"a": {OPEN: True, "b": 1}},
+             [{"a": {"z": 1, "c": 2}}, {"a": {"b": "x"}}, {}]),
+            (compile_validator, fullvalidate,
+             {"a": ["`$ONE`", "`$STRING`", {"b": "`$NUMBER`"}],
+              "c": ["`$CHILD`", {"d": "`$INTEGER`"}]},
+             [{"a": "A", "c": []}, {"a": {"b": 2}, "c": [{"d": 1}, {"d": 2}]},
+              {"a": 1, "c": []}, {"a": "A", "c": [{"d": "x"}]}]),
+        ]
+
+        def result(fn, data):
+            try:
+                return repr(fn(data))
+            except ValueError as err:
+                return 'error: ' + str(err)
+
+        for (compile_fn, oneshot, shape, datas) in cases:
+            before = repr(shape)
+            compiled = compile_fn(shape)
+            for data in datas:
+                self.assertEqual(result(compiled, clone(data)),
+                                 result(lambda d: oneshot(d, shape), clone(data)),
+                                 (shape, data))
+            self.assertEqual(repr(shape), before)
+
+        # Some results in full.
+        vf = compile_validator({"a": "`$STRING`", "b": 1})
+        self.assertEqual(vf({"a": "A"}), {"a": "A", "b": 1})
+        with self.assertRaises(ValueError):
+            vf({"a": 1})
+
+        vf = compile_validator({"a": "$foo"})
+        self.assertEqual(vf({"a": "bar"}), {"a": "$foo"})
+
+        vf = compile_validator({"b": {"d": "`$LIST`"}, "e": "`$ANY`"})
+        data = {"b": {"d": [{"x": 1}]}, "e": {"z": 1, "b": 2}}
+        out = vf(data)
+        self.assertEqual(out, data)
+        self.assertIsNot(out["b"]["d"], data["b"]["d"])
+        self.assertEqual(list(out["e"]), ["b", "z"])
+
+        tf = compile_spec({"x": "`a`", "y": ["`$EACH`", "b", {"z": "`$COPY`"}]})
+        self.assertEqual(tf({"a": 1, "b": [{"z": 2}]}), {"x": 1, "y": [{"z": 2}]})
+
+    def test_validate_child_scalars(self):
+        self.assertEqual(validate([1, 2, 3], ['`$CHILD`', '`$NUMBER`']), [1, 2, 3])
+        self.assertEqual(validate({"q": ["a", "b", "c"]}, {"q": ['`$CHILD`', '`$STRING`']}),
+                         {"q": ["a", "b", "c"]})
+
+    def test_validate_child_templates(self):
+        # Plain JSON templates are copied for each child.
+        out = validate({"x": {}, "y": {}}, {'`$CHILD`': {"a": {"b": [1]}}})
+        self.assertEqual(out, {"x": {"a": {"b": [1]}}, "y": {"a": {"b": [1]}}})
+        self.assertIsNot(out["x"]["a"], out["y"]["a"])
+        self.assertIsNot(out["x"]["a"]["b"], out["y"]["a"]["b"])
+
+        # Other templates are cloned: functions are kept by reference,
+        # and objects are copied by their JSON form.
+        def f0():
+            return 1
+
+        class J:
+            def to_json(self):
+                return {"j": 1}
+
+        out = validate({"x": {}, "y": {}}, {'`$CHILD`': {"f": f0, "o": J()}})
+        self.assertIs(out["x"]["f"], f0)
+        self.assertIs(out["y"]["f"], f0)
+        self.assertEqual(out["x"]["o"], {"j": 1})
+        self.assertIsNot(out["x"]["o"], out["y"]["o"])
+
+    def test_validate_one_tagged(self):
+        shape = {"s": ['`$ONE`',
+                       {"kind": ['`$EXACT`', "a"], "x": '`$STRING`'},
+                       {"kind": ['`$EXACT`', "b"], "y": '`$NUMBER`'}]}
+        self.assertEqual(validate({"s": {"kind": "b", "y": 1}}, shape),
+                         {"s": {"kind": "b", "y": 1}})
+        errs = []
+        validate({"s": {"kind": "c", "y": 1}}, shape, {"errs": errs})
+        self.assertEqual(len(errs), 1)
+
+        # Path reference alternatives are validated, not ruled out.
+        self.assertEqual(validate(-3, ['`$ONE`', '`x.y`', '`$MAP`']), -3)
+        errs = []
+        validate(-3, ['`$ONE`', '`x.y`', '`$MAP`'], {"errs": errs})
+        self.assertEqual(errs, [])
+
+    def test_validate_maxerrs(self):
+        shape = {"a": "`$STRING`", "b": "`$STRING`", "c": "`$STRING`"}
+        errs = []
+        out = validate({"a": 1, "b": 2, "c": 3}, shape, {"errs": errs, "maxerrs": 2})
+        self.assertEqual(out, None)
+        self.assertEqual(len(errs), 2)
+
+        errs = []
+        out = validate({"a": "A", "b": 2, "c": "C"}, shape, {"errs": errs, "maxerrs": 2})
+        self.assertEqual(out, {"a": "A", "b": 2, "c": "C"})
+        self.assertEqual(len(errs), 1)
+
     def test_validate_edge(self):
         errs = []
         validate({"x": 1}, {"x": '`$INSTANCE`'}, {"errs": errs})
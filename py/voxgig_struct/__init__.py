@@ -2,6 +2,8 @@
 
 from .voxgig_struct import (
     clone,
+    compile_spec,
+    compile_validator,
     delprop,
     escre,
     escurl,
@@ -41,10 +41,17 @@ import json
 import re
 import math
 import inspect
+import functools
+import pickle
 
 # Regex patterns for path processing
 R_META_PATH = re.compile(r'^([^$]+)\$([=~])(.+)$')  # Meta path syntax.
 R_DOUBLE_DOLLAR = re.compile(r'\$\$')               # Double dollar escape sequence.
+R_INJECT_FULL = re.compile(r'^`(\$[A-Z]+|[^`]*)[0-9]*`$')  # Full string injection.
+R_INJECT_PART = re.compile(r'`([^`]*)`')                  # Partial string injection.
+R_INJECT_ESC = re.compile(r'\$(BT|DS)')                 # Escapes inside injections.
+R_CMD_NAME = re.compile(r'`\$([A-Z]+)`')                   # Command reference in a spec.
+R_ESCRE = re.compile(r'([.*+?^${}()|\[\]\\])')             # Regular expression special chars.
 
 # Mode value for inject step.
 S_MKEYPRE =  'key:pre'
@@ -69,6 +76,7 @@ S_BMETA =  'meta'
 S_BEXACT =  '`$EXACT`'
 S_BVAL = '`$VAL`'
 S_BKEY = '`$KEY`'
+S_BOPEN = '`$OPEN`'
 
 # General strings.
 S_array =  'array'
@@ -141,6 +149,22 @@ TYPENAME = [
     S_node,
 ]
 
+# Type flags of exact builtin types, for fast lookup in typify.
+# Float is excluded, as NaN is not a number.
+_TYPIFY_EXACT = {
+    type(None): T_scalar | T_null,
+    bool: T_scalar | T_boolean,
+    int: T_scalar | T_number | T_integer,
+    str: T_scalar | T_string,
+    list: T_node | T_list,
+    dict: T_node | T_map,
+}
+
+_TYPENAME_LEN = len(TYPENAME)
+
+# Type flags by type name, as used by validate_TYPE.
+_TYPEFLAG = {tname: 1 << (31 - tI) for tI, tname in enumerate(TYPENAME) if S_MT != tname}
+
 S_VIZ = ': '
 
 # The standard undefined value for this language.
@@ -153,6 +177,12 @@ class Injection:
     """
     Injection state used for recursive injection into JSON-like data structures.
     """
+    __slots__ = (
+        'mode', 'full', 'keyI', 'keys', 'key', 'val', 'parent', 'path', 'nodes',
+        'handler', 'errs', 'meta', 'base', 'modify', 'extra', 'prior',
+        'dparent', 'dpath', 'root', 'static',
+    )
+
     def __init__(
         self,
         mode: str,                    # Injection mode: key:pre, val, key:post.
@@ -190,55 +220,69 @@ class Injection:
         self.dparent = UNDEF
         self.dpath = [S_DTOP]
         self.root = None  # Virtual root parent; set at top level so we can return it after transforms
+        self.static = {}  # Memo of nodes with or without injections, by id (see _hasinject).
 
     def descend(self):
-        if '__d' not in self.meta:
-            self.meta['__d'] = 0
-        self.meta['__d'] += 1
+        meta = self.meta
+        meta['__d'] = meta.get('__d', 0) + 1
 
-        parentkey = getelem(self.path, -2)
+        path = self.path
+        parentkey = path[-2] if 1 < len(path) else UNDEF
+        dpath = self.dpath
 
         if self.dparent is UNDEF:
-            if 1 < size(self.dpath):
-                self.dpath = self.dpath + [parentkey]
+            if 1 < len(dpath):
+                self.dpath = dpath + [parentkey]
         else:
             if parentkey is not None:
                 self.dparent = getprop(self.dparent, parentkey)
 
-                lastpart = getelem(self.dpath, -1)
+                lastpart = dpath[-1] if 0 < len(dpath) else UNDEF
                 if lastpart == '$:' + str(parentkey):
-                    self.dpath = slice(self.dpath, -1)
+                    self.dpath = dpath[:-1]
                 else:
-                    self.dpath = self.dpath + [parentkey]
+                    self.dpath = dpath + [parentkey]
 
         return self.dparent
 
-    def child(self, keyI: int, keys: List[str]) -> 'Injection':
-        """Create a child state object with the given key index and keys."""
-        key = strkey(keys[keyI])
+    def child(self, keyI: int, keys: List[str], nodes: List[Any] = None) -> 'Injection':
+        """Create a child state object with the given key index and keys.
+        Siblings may pass a shared `nodes` stack, as it is never mutated in place."""
+        rawkey = keys[keyI]
+        key = rawkey if isinstance(rawkey, str) else strkey(rawkey)
         val = self.val
+
+        # Map keys and list indexes are used as given, when possible.
+        if isinstance(val, dict):
+            cval = val.get(key)
+        elif isinstance(val, list) and type(rawkey) is int and 0 <= rawkey < len(val):
+            cval = val[rawkey]
+        else:
+            cval = getprop(val, key)
         
-        cinj = Injection(
-            mode=self.mode,
-            full=self.full,
-            keyI=keyI,
-            keys=keys,
-            key=key,
-            val=getprop(val, key),
-            parent=val,
-            path=self.path + [key],
-            nodes=self.nodes + [val],
-            handler=self.handler,
-            errs=self.errs,
-            meta=self.meta,
-            base=self.base,
-            modify=self.modify
-        )
+        # One child is created per key visited, so the slots are filled
+        # directly rather than through the keyword constructor.
+        cinj = Injection.__new__(Injection)
+        cinj.mode = self.mode
+        cinj.full = self.full
+        cinj.keyI = keyI
+        cinj.keys = keys
+        cinj.key = key
+        cinj.val = cval
+        cinj.parent = val
+        cinj.path = self.path + [key]
+        cinj.nodes = self.nodes + [val] if nodes is None else nodes
+        cinj.handler = self.handler
+        cinj.errs = self.errs
+        cinj.meta = self.meta or {}
+        cinj.base = self.base
+        cinj.modify = self.modify
         cinj.prior = self
-        cinj.dpath = self.dpath[:]
+        cinj.dpath = self.dpath  # Replaced, never mutated, by descend.
         cinj.dparent = self.dparent
         cinj.extra = self.extra  # Preserve extra (contains transform functions)
-        cinj.root = getattr(self, 'root', None)
+        cinj.root = self.root
+        cinj.static = self.static
         
         return cinj
 
@@ -375,7 +419,7 @@ def pad(s: Any, padding: int = UNDEF, padchar: str = UNDEF) -> str:
 
 
 def strkey(key: Any = UNDEF) -> str:
-    if UNDEF == key:
+    if key is UNDEF:
         return S_MT
 
     if isinstance(key, str):
@@ -395,16 +439,10 @@ def strkey(key: Any = UNDEF) -> str:
 
 def isempty(val: Any = UNDEF) -> bool:
     "Check for an 'empty' value - None, empty string, array, object."
-    if UNDEF == val:
-        return True
-    
-    if val == S_MT:
+    if val is UNDEF or val == S_MT:
         return True
     
-    if islist(val) and len(val) == 0:
-        return True
-    
-    if ismap(val) and len(val) == 0:
+    if isinstance(val, (list, dict)) and len(val) == 0:
         return True
     
     return False    
@@ -422,7 +460,10 @@ def _clz32(n):
 
 
 def typename(t):
-    return getelem(TYPENAME, _clz32(t), TYPENAME[0])
+    # Index TYPENAME directly, with getelem's range rules (negative
+    # positions count from the end), avoiding its key parsing.
+    tI = _clz32(t)
+    return TYPENAME[tI] if -_TYPENAME_LEN <= tI < _TYPENAME_LEN else TYPENAME[0]
 
 
 _TYPIFY_NO_ARG = object()
@@ -431,6 +472,9 @@ _TYPIFY_NO_ARG = object()
 def typify(value: Any = _TYPIFY_NO_ARG) -> int:
     if value is _TYPIFY_NO_ARG:
         return T_noval
+    t = _TYPIFY_EXACT.get(type(value))
+    if t is not None:
+        return t
     if value is None:
         return T_scalar | T_null
     if isinstance(value, bool):
@@ -438,7 +482,6 @@ def typify(value: Any = _TYPIFY_NO_ARG) -> int:
     if isinstance(value, int):
         return T_scalar | T_number | T_integer
     if isinstance(value, float):
-        import math
         if math.isnan(value):
             return T_noval
         return T_scalar | T_number | T_decimal
@@ -460,7 +503,7 @@ def getelem(val: Any, key: Any, alt: Any = UNDEF) -> Any:
     """
     out = UNDEF
 
-    if UNDEF == val or UNDEF == key:
+    if val is UNDEF or key is UNDEF:
         return alt
 
     if islist(val):
@@ -473,7 +516,7 @@ def getelem(val: Any, key: Any, alt: Any = UNDEF) -> Any:
         except (ValueError, IndexError):
             pass
 
-    if UNDEF == out:
+    if out is UNDEF:
         return alt() if 0 < (T_function & typify(alt)) else alt
 
     return out
@@ -484,32 +527,22 @@ def getprop(val: Any = UNDEF, key: Any = UNDEF, alt: Any = UNDEF) -> Any:
     Safely get a property of a node. Undefined arguments return undefined.
     If the key is not found, return the alternative value.
     """
-    if UNDEF == val:
+    if val is UNDEF or key is UNDEF:
         return alt
 
-    if UNDEF == key:
-        return alt
+    if isinstance(val, dict):
+        out = val.get(key if isinstance(key, str) else str(key))
+        return alt if out is UNDEF else out
 
-    out = alt
-    
-    if ismap(val):
-        out = val.get(str(key), alt)
-    
-    elif islist(val):
+    if isinstance(val, list):
         try:
             key = int(key)
         except:
             return alt
 
-        if 0 <= key < len(val):
-            return val[key]
-        else:
-            return alt
+        return val[key] if 0 <= key < len(val) else alt
 
-    if UNDEF == out:
-        return alt
-        
-    return out
+    return alt
 
 
 def keysof(val: Any = UNDEF) -> list[str]:
@@ -517,25 +550,48 @@ def keysof(val: Any = UNDEF) -> list[str]:
     if not isnode(val):
         return []
     elif ismap(val):
-        return sorted(val.keys())
+        return list(_sortedkeys(tuple(val))) if _SORTCACHE_MIN <= len(val) \
+            else sorted(val.keys())
     else:
         return [str(x) for x in list(range(len(val)))]
 
 
 def haskey(val: Any = UNDEF, key: Any = UNDEF) -> bool:
     "Value of property with name key in node val is defined."
-    return UNDEF != getprop(val, key)
+    if isinstance(val, dict) and isinstance(key, str):
+        return val.get(key) is not UNDEF
+    return getprop(val, key) is not UNDEF
 
     
 def items(val: Any = UNDEF, apply=None):
     "List the keys of a map or list as an array of [key, value] tuples."
-    if not isnode(val):
-        return []
-    keys = keysof(val)
-    out = [[k, val[k] if ismap(val) else val[int(k)]] for k in keys]
+    out = [[k, v] for (k, v) in _itemiter(val)]
     if apply is not None:
         out = [apply(item) for item in out]
     return out
+
+
+def _itemiter(val):
+    """Iterate (key, value) pairs in the same order as items, without
+    building the intermediate [key, value] lists."""
+    if isinstance(val, dict):
+        if _SORTCACHE_MIN <= len(val):
+            return iter([(k, val[k]) for k in _sortedkeys(tuple(val))])
+        return iter(sorted(val.items()))
+    if isinstance(val, list):
+        return zip(map(str, range(len(val))), val[:])
+    return iter(())
+
+
+# Maps with at least this many keys look up their sorted key order in a
+# cache, as the same spec and data shapes are traversed repeatedly. Smaller
+# maps are faster to sort directly.
+_SORTCACHE_MIN = 8
+
+
+@functools.lru_cache(maxsize=1024)
+def _sortedkeys(keys):
+    return tuple(sorted(keys))
     
 
 def flatten(lst, depth=None):
@@ -564,15 +620,14 @@ def filter(val, check):
 
 def escre(s: Any):
     "Escape regular expression."
-    if UNDEF == s:
+    if s is UNDEF:
         s = ""
-    pattern = r'([.*+?^${}()|\[\]\\])'
-    return re.sub(pattern, r'\\\1', s)
+    return R_ESCRE.sub(r'\\\1', s)
 
 
 def escurl(s: Any):
     "Escape URLs."
-    if UNDEF == s:
+    if s is UNDEF:
         s = S_MT
     return urllib.parse.quote(s, safe="")
 
@@ -589,6 +644,8 @@ def replace(s, from_pat, to_str):
         rs = stringify(s)
     if isinstance(from_pat, str):
         return rs.replace(from_pat, str(to_str))
+    elif isinstance(from_pat, re.Pattern):
+        return from_pat.sub(str(to_str), rs)
     else:
         return re.sub(from_pat, str(to_str), rs)
 
@@ -597,25 +654,29 @@ def join(arr, sep=UNDEF, url=UNDEF):
     if not islist(arr):
         return S_MT
     sepdef = S_CM if sep is UNDEF or sep is None else sep
-    sepre = escre(sepdef) if 1 == size(sepdef) else UNDEF
+    sepre = 1 == size(sepdef)
 
     sarr = size(arr)
     filtered = [(i, s) for i, s in enumerate(arr)
                 if isinstance(s, str) and S_MT != s]
 
+    if sepre:
+        re_trail, re_lead, re_inner = _joinre(sepdef)
+
     result = []
     for idx, s in filtered:
-        if sepre is not UNDEF and S_MT != sepre:
+        # The patterns can only match where the separator occurs.
+        if sepre and sepdef in s:
             if url and 0 == idx:
-                s = re.sub(sepre + '+$', S_MT, s)
+                s = re_trail.sub(S_MT, s)
                 result.append(s)
                 continue
-            if 0 < idx:
-                s = re.sub('^' + sepre + '+', S_MT, s)
+            if 0 < idx and s.startswith(sepdef):
+                s = re_lead.sub(S_MT, s)
             if idx < sarr - 1 or not url:
-                s = re.sub(sepre + '+$', S_MT, s)
-            s = re.sub('([^' + sepre + '])' + sepre + '+([^' + sepre + '])',
-                        r'\1' + sepdef + r'\2', s)
+                s = re_trail.sub(S_MT, s)
+            if sepdef + sepdef in s:
+                s = re_inner.sub(r'\1' + sepdef + r'\2', s)
 
         if S_MT != s:
             result.append(s)
@@ -623,6 +684,17 @@ def join(arr, sep=UNDEF, url=UNDEF):
     return sepdef.join(result)
 
 
+# Separator patterns for join, escaped and compiled once per separator.
+@functools.lru_cache(maxsize=64)
+def _joinre(sep):
+    sepre = escre(sep)
+    return (
+        re.compile(sepre + '+$'),
+        re.compile('^' + sepre + '+'),
+        re.compile('([^' + sepre + '])' + sepre + '+([^' + sepre + '])'),
+    )
+
+
 def joinurl(sarr):
     "Concatenate url part strings, merging forward slashes as needed."
     return join(sarr, '/', True)
@@ -648,13 +720,9 @@ def delprop(parent: Any, key: Any):
         except ValueError:
             return parent
 
-        key_i = int(key_i)  # Floor the value
-
         # Delete list element at position key_i, shifting later elements down
         if 0 <= key_i < len(parent):
-            for pI in range(key_i, len(parent) - 1):
-                parent[pI] = parent[pI + 1]
-            parent.pop()
+            del parent[key_i]
 
     return parent
 
@@ -682,7 +750,7 @@ def jsonify(val: Any = UNDEF, flags: Dict[str, Any] = None) -> str:
     offset = getprop(flags, 'offset', 0)
     if 0 < offset:
         lines = json_str.split('\n')
-        padded = [pad(n[1], 0 - offset - size(n[1])) for n in items(lines[1:])]
+        padded = [pad(line, 0 - offset - size(line)) for line in lines[1:]]
         json_str = '{\n' + '\n'.join(padded)
     
     return json_str
@@ -735,7 +803,7 @@ def select_AND(state, _val, _ref, store):
         point = getpath(store, ppath)
 
         vstore = merge([{}, store], 1)
-        vstore['$TOP'] = point
+        vstore[S_DTOP] = point
 
         for term in terms:
             terrs = []
@@ -763,7 +831,7 @@ def select_OR(state, _val, _ref, store):
         point = getpath(store, ppath)
 
         vstore = merge([{}, store], 1)
-        vstore['$TOP'] = point
+        vstore[S_DTOP] = point
 
         for term in terms:
             terrs = []
@@ -792,7 +860,7 @@ def select_NOT(state, _val, _ref, store):
         point = getpath(store, ppath)
 
         vstore = merge([{}, store], 1)
-        vstore['$TOP'] = point
+        vstore[S_DTOP] = point
 
         terrs = []
         validate(point, term, {
@@ -831,8 +899,7 @@ def select_CMP(state, _val, ref, store):
         elif '$LTE' == ref and point <= term:
             pass_test = True
         elif '$LIKE' == ref:
-            import re as re_mod
-            if re_mod.search(term, stringify(point)):
+            if re.search(term, stringify(point)):
                 pass_test = True
 
         if pass_test:
@@ -856,13 +923,18 @@ def select(children: Any, query: Any) -> List[Any]:
         return []
     
     if ismap(children):
-        children = [setprop(v, S_DKEY, k) or v for k, v in items(children)]
+        children = [setprop(v, S_DKEY, k) or v for k, v in _itemiter(children)]
     else:
         children = [setprop(n, S_DKEY, i) or n if ismap(n) else n for i, n in enumerate(children)]
     
     results = []
+    errs = []
+
+    # Only whether a child has any errors matters, so validation of a
+    # child stops at the first error.
     injdef = {
-        'errs': [],
+        'errs': errs,
+        'maxerrs': 1,
         'meta': {S_BEXACT: True},
         'extra': {
             '$AND': select_AND,
@@ -881,16 +953,19 @@ def select(children: Any, query: Any) -> List[Any]:
     # Add $OPEN to all maps in the query
     def add_open(_k, v, _parent, _path):
         if ismap(v):
-            setprop(v, '`$OPEN`', getprop(v, '`$OPEN`', True))
+            setprop(v, S_BOPEN, getprop(v, S_BOPEN, True))
         return v
     
     walk(q, add_open)
-    
+
+    # The query is compiled once, and cloned by the validator for each child.
+    validator = compile_validator(q, injdef)
+
     for child in children:
-        injdef['errs'] = []
-        validate(child, clone(q), injdef)
+        errs.clear()
+        validator(child)
         
-        if size(injdef['errs']) == 0:
+        if 0 == len(errs):
             results.append(child)
     
     return results
@@ -902,10 +977,19 @@ def stringify(val: Any, maxlen: int = UNDEF, pretty: Any = None):
     pretty = bool(pretty)
     valstr = S_MT
 
-    if UNDEF == val:
+    if val is UNDEF:
         return '<>' if pretty else valstr
 
-    if isinstance(val, str):
+    vtype = type(val)
+    if vtype is str:
+        valstr = val
+    elif vtype is bool:
+        valstr = 'true' if val else 'false'
+    elif vtype is int:
+        valstr = str(val)
+    elif vtype is float and math.isfinite(val):
+        valstr = repr(val)
+    elif isinstance(val, str):
         valstr = val
     else:
         try:
@@ -957,28 +1041,26 @@ def pathify(val: Any = UNDEF, startin: int = UNDEF, endin: int = UNDEF) -> str:
     start = 0 if startin is UNDEF else startin if -1 < startin else 0
     end = 0 if endin is UNDEF else endin if -1 < endin else 0
 
-    if UNDEF != path and 0 <= start:
+    if path is not UNDEF and 0 <= start:
         path = path[start:len(path)-end]
 
         if 0 == len(path):
             pathstr = "<root>"
         else:
-            # Filter path parts to include only valid keys
-            filtered_path = [p for p in path if iskey(p)]
-            
-            # Map path parts: convert numbers to strings and remove any dots
-            mapped_path = []
-            for p in filtered_path:
-                if isinstance(p, (int, float)):
-                    mapped_path.append(S_MT + str(int(p)))
-                else:
-                    mapped_path.append(str(p).replace('.', S_MT))
-            
-            pathstr = S_DT.join(mapped_path)
+            # Include only valid keys: convert numbers to strings and
+            # remove any dots. Plain string parts, the common case, are
+            # checked inline.
+            pathstr = S_DT.join([
+                (p.replace(S_DT, S_MT) if type(p) is str else
+                 str(int(p)) if isinstance(p, (int, float)) else
+                 str(p).replace(S_DT, S_MT))
+                for p in path
+                if (S_MT != p if type(p) is str else iskey(p))
+            ])
 
     # Handle the case where we couldn't create a path
-    if UNDEF == pathstr:
-        pathstr = f"<unknown-path{S_MT if UNDEF == val else S_CN+stringify(val, 47)}>"
+    if pathstr is UNDEF:
+        pathstr = f"<unknown-path{S_MT if val is UNDEF else S_CN+stringify(val, 47)}>"
 
     return pathstr
 
@@ -988,48 +1070,117 @@ def clone(val: Any = UNDEF):
     Clone a JSON-like data structure.
     NOTE: function value references are copied, *not* cloned.
     """
-    if UNDEF == val:
+    if val is UNDEF:
         return UNDEF
 
-    refs = []
-
-    def replacer(item):
-        if callable(item):
-            refs.append(item)
-            return f'`$FUNCTION:{len(refs) - 1}`'
-        elif isinstance(item, dict):
-            return {k: replacer(v) for k, v in item.items()}
-        elif isinstance(item, (list, tuple)):
-            return [replacer(elem) for elem in item]
-        elif hasattr(item, 'to_json'):
-            return item.to_json()
-        elif hasattr(item, '__dict__'):
-            return item.__dict__ 
-        else:
-            return item
+    return _clone(val)
 
-    transformed = replacer(val)
 
-    json_str = json.dumps(transformed, separators=(',', ':'))
+# Immutable JSON scalar types, returned as-is by clone.
+_CLONE_SCALARS = frozenset((str, int, float, bool, type(None)))
 
-    def reviver(item):
-        if isinstance(item, str):
-            match = re.match(r'^`\$FUNCTION:(\d+)`$', item)
-            if match:
-                index = int(match.group(1))
-                return refs[index]
-            else:
-                return item
-        elif isinstance(item, list):
-            return [reviver(elem) for elem in item]
-        elif isinstance(item, dict):
-            return {k: reviver(v) for k, v in item.items()}
+
+# Nodes nested deeper than this are taken to be a reference cycle.
+_CLONE_MAXDEPTH = 100000
+
+
+def _clone(val):
+    # Copy nodes with an explicit stack of (source, copy, depth) entries,
+    # so that deeply nested data does not reach the recursion limit; avoids
+    # a JSON encode/decode round trip. Scalar children are copied inline.
+    if type(val) in _CLONE_SCALARS:
+        return val
+    if not isinstance(val, (dict, list, tuple)):
+        return _cloneother(val)
+
+    out = {} if isinstance(val, dict) else []
+    stack = [(val, out, 0)]
+    while stack:
+        (src, dst, depth) = stack.pop()
+        if _CLONE_MAXDEPTH < depth:
+            raise RecursionError('clone: maximum depth exceeded')
+        cdepth = depth + 1
+
+        if isinstance(src, dict):
+            for (k, v) in src.items():
+                if type(k) is not str:
+                    k = _clonekey(k)
+                if type(v) in _CLONE_SCALARS:
+                    dst[k] = v
+                elif isinstance(v, dict):
+                    dst[k] = child = {}
+                    stack.append((v, child, cdepth))
+                elif isinstance(v, (list, tuple)):
+                    dst[k] = child = []
+                    stack.append((v, child, cdepth))
+                else:
+                    dst[k] = _cloneother(v)
         else:
-            return item
+            for v in src:
+                if type(v) in _CLONE_SCALARS:
+                    dst.append(v)
+                elif isinstance(v, dict):
+                    dst.append(child := {})
+                    stack.append((v, child, cdepth))
+                elif isinstance(v, (list, tuple)):
+                    dst.append(child := [])
+                    stack.append((v, child, cdepth))
+                else:
+                    dst.append(_cloneother(v))
+
+    return out
+
+
+# Map keys that are not strings are converted as JSON does, so that
+# clone gives the same keys as a JSON round trip.
+def _clonekey(key):
+    if isinstance(key, str):
+        return key
+    return next(iter(json.loads(json.dumps({key: 0}))))
 
-    parsed = json.loads(json_str)
 
-    return reviver(parsed)
+def _clonemany(val, count):
+    # Copies of a plain JSON node are unpickled from one pickle, which
+    # is faster than cloning each copy. Only trees checked by _isjsonnode
+    # are pickled, as for those a pickle copy is the same as a clone;
+    # anything else (functions, objects, shared nodes) uses _clone.
+    if 1 < count and _isjsonnode(val, set()):
+        pval = pickle.dumps(val, pickle.HIGHEST_PROTOCOL)
+        return [pickle.loads(pval) for _ in range(count)]
+    return [_clone(val) for _ in range(count)]
+
+
+# True if val is a tree of dicts, lists and JSON scalars with no shared
+# nodes, so that a pickle copy is the same as a clone.
+def _isjsonnode(val, seen):
+    if id(val) in seen:
+        return False
+    seen.add(id(val))
+    if type(val) is dict:
+        children = val.values()
+        if not all(type(key) is str for key in val):
+            return False
+    elif type(val) is list:
+        children = val
+    else:
+        return False
+    for child in children:
+        if type(child) in _CLONE_SCALARS:
+            continue
+        if not _isjsonnode(child, seen):
+            return False
+    return True
+
+
+def _cloneother(val):
+    # Functions are copied by reference, and objects by their JSON form.
+    if callable(val):
+        return val
+    elif hasattr(val, 'to_json'):
+        return _clone(val.to_json())
+    elif hasattr(val, '__dict__'):
+        return _clone(val.__dict__)
+    return val
 
 
 def setprop(parent: Any, key: Any, val: Any):
@@ -1039,17 +1190,21 @@ def setprop(parent: Any, key: Any, val: Any):
     - For lists, negative key -> prepend.
     - For lists, key > len(list) -> append.
     """
-    if not iskey(key):
-        return parent
-
-    if ismap(parent):
-        key = str(key)
+    if isinstance(parent, dict):
+        # Non-empty string keys, the common case, are used as is.
+        if not isinstance(key, str) or S_MT == key:
+            if not iskey(key):
+                return parent
+            key = str(key)
         if val is None:
             parent.pop(key, None)
         else:
             parent[key] = val
 
-    elif islist(parent):
+    elif isinstance(parent, list):
+        if not iskey(key):
+            return parent
+
         try:
             key_i = int(key)
         except ValueError:
@@ -1057,9 +1212,7 @@ def setprop(parent: Any, key: Any, val: Any):
 
         if val is None:
             if 0 <= key_i < len(parent):
-                for pI in range(key_i, len(parent) - 1):
-                    parent[pI] = parent[pI + 1]
-                parent.pop()
+                del parent[key_i]
         else:
             if key_i >= 0:
                 key_i = min(key_i, len(parent))
@@ -1094,32 +1247,76 @@ def walk(
     """
     if path is UNDEF:
         path = []
-
-    _before = before
     _after = after if after is not None else apply
+    md = maxdepth if maxdepth is not None and 0 <= maxdepth else MAXDEPTH
 
-    out = val if _before is None else _before(key, val, parent, path)
+    return _walk(val, key, parent, path, before, _after, md)
 
-    md = maxdepth if maxdepth is not None and 0 <= maxdepth else MAXDEPTH
-    if 0 == md or (path is not None and 0 < md and md <= len(path)):
+
+def _walk(val, key, parent, path, before, after, md):
+    # Iterative depth-first walk using an explicit stack of frames
+    # (node, key, parent, child-iterator, original-child, node-path), so
+    # deep structures do not consume Python call frames. The current path
+    # is a single list, pushed and popped around each child, and each
+    # node's callbacks get their own copy of it, which they may keep.
+    # Results are only written back if they are new values.
+    if before is None and after is None:
+        return val
+
+    out = val if before is None else before(key, val, parent, path)
+
+    if 0 == md or md <= len(path):
         return out
 
-    if isnode(out):
-        for (ckey, child) in items(out):
-            result = walk(
-                child, key=ckey, parent=out,
-                path=flatten([path or [], str(ckey)]),
-                before=_before, after=_after, maxdepth=md,
-            )
-            if ismap(out):
-                out[str(ckey)] = result
-            elif islist(out):
-                out[int(ckey)] = result
-
-    if _after is not None:
-        out = _after(key, out, parent, path)
+    if not isinstance(out, (dict, list)):
+        return out if after is None else after(key, out, parent, path)
 
-    return out
+    stack = [(out, key, parent, _itemiter(out), val, path)]
+    path = list(path)
+
+    while stack:
+        node, nkey, nparent, nitems, norig, npath = stack[-1]
+        nitem = next(nitems, UNDEF)
+
+        if nitem is not UNDEF:
+            ckey, child = nitem
+
+            path.append(str(ckey))
+            cpath = path[:]
+            cout = child if before is None else before(ckey, child, node, cpath)
+
+            # Depth limit reached: no descent, and no after callback.
+            if md <= len(path):
+                pass
+
+            elif isinstance(cout, (dict, list)):
+                stack.append((cout, ckey, node, _itemiter(cout), child, cpath))
+                continue
+
+            elif after is not None:
+                cout = after(ckey, cout, node, cpath)
+
+            path.pop()
+            if cout is not child:
+                _walkset(node, ckey, cout)
+
+        else:
+            stack.pop()
+            nout = node if after is None else after(nkey, node, nparent, npath)
+
+            if 0 == len(stack):
+                return nout
+
+            path.pop()
+            if nout is not norig:
+                _walkset(nparent, nkey, nout)
+
+
+def _walkset(parent, key, val):
+    if isinstance(parent, dict):
+        parent[key] = val
+    else:
+        parent[int(key)] = val
 
 
 def merge(objs: List[Any] = None, maxdepth: Any = None) -> Any:
@@ -1147,71 +1344,114 @@ def merge(objs: List[Any] = None, maxdepth: Any = None) -> Any:
     for oI in range(1, lenlist):
         obj = objs[oI]
 
-        if not isnode(obj):
+        if not isinstance(obj, (dict, list)):
+            out = obj
+        elif 0 == md:
             out = obj
         else:
-            cur = [out]
-            dst = [out]
-
-            def before(key, val, _parent, path):
-                pI = size(path)
-
-                if md <= pI:
-                    cur_len = len(cur)
-                    if pI >= cur_len:
-                        cur.extend([UNDEF] * (pI + 1 - cur_len))
-                    cur[pI] = val
-                    if pI > 0 and pI - 1 < len(cur):
-                        setprop(cur[pI - 1], key, val)
-                    return UNDEF
-
-                elif not isnode(val):
-                    cur_len = len(cur)
-                    if pI >= cur_len:
-                        cur.extend([UNDEF] * (pI + 1 - cur_len))
-                    cur[pI] = val
+            out = _mergenode(out, obj, 0, md)
 
-                else:
-                    dst_len = len(dst)
-                    if pI >= dst_len:
-                        dst.extend([UNDEF] * (pI + 1 - dst_len))
-                    cur_len = len(cur)
-                    if pI >= cur_len:
-                        cur.extend([UNDEF] * (pI + 1 - cur_len))
-
-                    dst[pI] = getprop(dst[pI - 1], key) if 0 < pI else dst[pI]
-                    tval = dst[pI]
-
-                    if UNDEF == tval:
-                        cur[pI] = [] if islist(val) else {}
-                    elif (islist(val) and islist(tval)) or (ismap(val) and ismap(tval)):
-                        cur[pI] = tval
-                    else:
-                        cur[pI] = val
-                        val = UNDEF
+    if 0 == md:
+        out = getprop(objs, lenlist - 1, UNDEF)
+        out = [] if islist(out) else {} if ismap(out) else out
 
-                return val
+    return out
 
-            def after(key, _val, _parent, path):
-                cI = size(path)
-                if cI < 1:
-                    return cur[0] if len(cur) > 0 else _val
 
-                target = cur[cI - 1] if cI - 1 < len(cur) else UNDEF
-                value = cur[cI] if cI < len(cur) else UNDEF
+def _mergenode(tval, val, depth, md):
+    # Merge node val onto target node tval, descending with both
+    # references together so no path needs to be tracked or re-walked.
+    vismap = isinstance(val, dict)
+    if tval is UNDEF:
+        out = {} if vismap else []
+    elif isinstance(tval, dict) if vismap else isinstance(tval, list):
+        out = tval
+    else:
+        return val
 
-                setprop(target, key, value)
-                return value
+    cdepth = depth + 1
+    descend = cdepth < md
+
+    if vismap:
+        # Map entries are read and set directly, with keys as strings,
+        # invalid keys skipped and null deleting, as in setprop.
+        for (skey, child) in _itemiter(val):
+            ckey = skey
+            if not isinstance(ckey, str) or S_MT == ckey:
+                if not iskey(ckey):
+                    # Invalid keys are not set, but a node of the same
+                    # kind already held under the key is merged in place.
+                    if descend and isinstance(child, (dict, list)):
+                        prior = getprop(out, ckey)
+                        if isinstance(prior, dict) if isinstance(child, dict) \
+                                else isinstance(prior, list):
+                            _mergenode(prior, child, cdepth, md)
+                    continue
+                ckey = str(ckey)
+            if descend and isinstance(child, (dict, list)):
+                if child is out:
+                    # A target that is also its own source child is copied
+                    # before it changes, and the source refers to the copy.
+                    child = _mergenode(out.get(ckey), _clone(child), cdepth, md)
+                    val[skey] = child
+                else:
+                    child = _mergenode(out.get(ckey), child, cdepth, md)
+            if child is None:
+                out.pop(ckey, None)
+            else:
+                out[ckey] = child
+    else:
+        for (ckey, child) in _itemiter(val):
+            if descend and isinstance(child, (dict, list)):
+                if child is out:
+                    child = _mergenode(getprop(out, ckey), _clone(child), cdepth, md)
+                    val[int(ckey)] = child
+                else:
+                    child = _mergenode(getprop(out, ckey), child, cdepth, md)
+            setprop(out, ckey, child)
 
-            out = walk(obj, before=before, after=after)
+    return out
 
-    if 0 == md:
-        out = getprop(objs, lenlist - 1, UNDEF)
-        out = [] if islist(out) else {} if ismap(out) else out
 
+def _mergeclone(val, depth):
+    # The same as _mergenode(UNDEF, _clone(val), depth, MAXDEPTH) for a
+    # dict, list or tuple val, but copying and merging in one pass.
+    cdepth = depth + 1
+    descend = cdepth < MAXDEPTH
+    if isinstance(val, dict):
+        # Keys are converted as clone does, so each key is unique, and
+        # the empty key is skipped, as in setprop.
+        if not all(type(ckey) is str for ckey in val):
+            val = {_clonekey(ckey): child for (ckey, child) in val.items()}
+        out = {}
+        for ckey in sorted(val):
+            if S_MT != ckey:
+                child = _mergeclonechild(val[ckey], cdepth, descend)
+                if child is not None:
+                    out[ckey] = child
+        return out
+
+    # Nulls are dropped from lists.
+    out = []
+    for child in val:
+        child = _mergeclonechild(child, cdepth, descend)
+        if child is not None:
+            out.append(child)
     return out
 
 
+def _mergeclonechild(child, cdepth, descend):
+    # Children are merged onto an empty target.
+    if type(child) in _CLONE_SCALARS:
+        return child
+    if isinstance(child, (dict, list, tuple)):
+        return _mergeclone(child, cdepth) if descend else _clone(child)
+    child = _cloneother(child)
+    if descend and isinstance(child, (dict, list)):
+        child = _mergenode(UNDEF, child, cdepth, MAXDEPTH)
+    return child
+
+
 def getpath(store, path, injdef=UNDEF):
     """
     Get a value from the store using a path.
@@ -1221,7 +1461,7 @@ def getpath(store, path, injdef=UNDEF):
     if islist(path):
         parts = path[:]
     elif isinstance(path, str):
-        parts = path.split(S_DT)
+        parts = _splitpath(path)
     elif isinstance(path, (int, float)) and not isinstance(path, bool):
         parts = [strkey(path)]
     else:
@@ -1251,18 +1491,21 @@ def getpath(store, path, injdef=UNDEF):
         return val
     elif numparts > 0:
         
+        part0 = parts[0]
+
         # Check for $ACTIONs
         if 1 == numparts:
-            val = getprop(store, parts[0])
+            val = getprop(store, part0)
         
         if not isfunc(val):
             val = src
             
             # Check for meta path syntax
-            m = R_META_PATH.match(parts[0]) if parts[0] else None
+            m = R_META_PATH.match(part0) \
+                if isinstance(part0, str) and S_DS in part0 else None
             if m and inj_meta:
                 val = getprop(inj_meta, m.group(1))
-                parts[0] = m.group(3)
+                parts = [m.group(3)] + list(parts[1:])
             
             
             for pI in range(numparts):
@@ -1274,19 +1517,22 @@ def getpath(store, path, injdef=UNDEF):
                 # Handle special path components
                 if injdef and part == S_DKEY:
                     part = inj_key if inj_key is not UNDEF else part
-                elif isinstance(part, str) and part.startswith('$GET:'):
+                elif not isinstance(part, str) or not part.startswith(S_DS):
+                    pass
+                elif part.startswith('$GET:'):
                     # $GET:path$ -> get store value, use as path part (string)
                     part = stringify(getpath(src, part[5:-1]))
-                elif isinstance(part, str) and part.startswith('$REF:'):
+                elif part.startswith('$REF:'):
                     # $REF:refpath$ -> get spec value, use as path part (string)
                     part = stringify(getpath(getprop(store, S_DSPEC), part[5:-1]))
-                elif injdef and isinstance(part, str) and part.startswith('$META:'):
+                elif injdef and part.startswith('$META:'):
                     # $META:metapath$ -> get meta value, use as path part (string)
                     part = stringify(getpath(inj_meta, part[6:-1]))
                 
                 # $$ escapes $ (path parts can be int e.g. list indices)
                 if isinstance(part, str):
-                    part = R_DOUBLE_DOLLAR.sub('$', part)
+                    if '$$' in part:
+                        part = R_DOUBLE_DOLLAR.sub('$', part)
                 else:
                     part = strkey(part)
                 
@@ -1304,7 +1550,7 @@ def getpath(store, path, injdef=UNDEF):
                             val = dparent
                         else:
                             fullpath = flatten(
-                                [slice(dpath, 0 - ascends), parts[pI + 1:]])
+                                [slice(dpath, 0 - ascends), list(parts[pI + 1:])])
                             if ascends <= size(dpath):
                                 val = getpath(store, fullpath)
                             else:
@@ -1312,18 +1558,30 @@ def getpath(store, path, injdef=UNDEF):
                             break
                     else:
                         val = dparent
+                elif isinstance(val, dict):
+                    # Parts are strings here, so maps are read directly.
+                    val = val.get(part)
                 else:
                     val = getprop(val, part)
     
     # Injdef may provide a custom handler to modify found value.
     handler = injdef.handler if isinstance(injdef, Injection) else (getprop(injdef, 'handler') if injdef else UNDEF)
-    if handler and isfunc(handler):
-        ref = pathify(path)
+    if callable(handler):
+        # A single key path is its own reference.
+        ref = path if isinstance(path, str) and S_MT != path and S_DT not in path \
+            else pathify(path)
         val = handler(injdef, val, ref, store)
     
     return val
 
 
+# String paths repeat heavily during injection, so cache the split parts.
+# The cache is bounded to avoid unbounded growth on pathological input.
+@functools.lru_cache(maxsize=4096)
+def _splitpath(path):
+    return tuple(path.split(S_DT))
+
+
 def setpath(store, path, val, injdef=UNDEF):
     pathType = typify(path)
 
@@ -1381,7 +1639,7 @@ def inject(val, store, injdef=UNDEF):
             parent=parent,
             path=[S_DTOP],
             nodes=[parent],
-            handler=_injecthandler,
+            handler=getprop(injdef, 'handler') or _injecthandler,
             base=S_DTOP,
             modify=getprop(injdef, 'modify') if injdef else None,
             meta=getprop(injdef, 'meta', {}),
@@ -1394,8 +1652,6 @@ def inject(val, store, injdef=UNDEF):
         if injdef is not UNDEF:
             if getprop(injdef, 'extra'):
                 inj.extra = getprop(injdef, 'extra')
-            if getprop(injdef, 'handler'):
-                inj.handler = getprop(injdef, 'handler')
             if getprop(injdef, 'dparent'):
                 inj.dparent = getprop(injdef, 'dparent')
             if getprop(injdef, 'dpath'):
@@ -1404,15 +1660,12 @@ def inject(val, store, injdef=UNDEF):
     inj.descend()
 
     # Descend into node.
-    if isnode(val):
+    vismap = isinstance(val, dict)
+    if vismap or isinstance(val, list):
         # Keys are sorted alphanumerically to ensure determinism.
         # Injection transforms ($FOO) are processed *after* other keys.
-        if ismap(val):
-            normal_keys = [k for k in val.keys() if S_DS not in k]
-            normal_keys.sort()
-            transform_keys = [k for k in val.keys() if S_DS in k]
-            transform_keys.sort()
-            nodekeys = normal_keys + transform_keys
+        if vismap:
+            nodekeys = list(_nodekeys(tuple(val)))
         else:
             nodekeys = list(range(len(val)))
 
@@ -1420,9 +1673,17 @@ def inject(val, store, injdef=UNDEF):
         # 1. inj.mode='key:pre' - Key string is injected, returning a possibly altered key.
         # 2. inj.mode='val' - The child value is injected.
         # 3. inj.mode='key:post' - Key string is injected again, allowing child mutation.
+        # All children share the same ancestor node stack.
+        childnodes = inj.nodes + [inj.val]
+
+        # With the default handler and no modifier, a child node without
+        # any backticks in its keys or strings is left unchanged by
+        # injection, so it need not be traversed.
+        skipstatic = inj.modify is None and inj.handler is _injecthandler
+
         nkI = 0
         while nkI < len(nodekeys):
-            childinj = inj.child(nkI, nodekeys)
+            childinj = inj.child(nkI, nodekeys, childnodes)
             nodekey = childinj.key
             childinj.mode = S_MKEYPRE
 
@@ -1439,7 +1700,10 @@ def inject(val, store, injdef=UNDEF):
                 childinj.mode = S_MVAL
 
                 # Perform the val mode injection on the child value.
-                inject(childinj.val, store, childinj)
+                cval = childinj.val
+                if not (skipstatic and isinstance(cval, (dict, list)) and
+                        not _hasinject(cval, inj.static)):
+                    inject(cval, store, childinj)
 
                 # The injection may modify child processing.
                 nkI = childinj.keyI
@@ -1473,26 +1737,80 @@ def inject(val, store, injdef=UNDEF):
     inj.val = val
 
     # Return the (possibly transform-replaced) root only at top level (prior is None).
-    if getattr(inj, 'prior', None) is None and getattr(inj, 'root', None) is not None and haskey(inj.root, S_DTOP):
-        return getprop(inj.root, S_DTOP)
-    if inj.key == S_DTOP and inj.parent is not UNDEF and haskey(inj.parent, S_DTOP):
-        return getprop(inj.parent, S_DTOP)
+    # This runs for every node, so each holder is probed with a single get.
+    if inj.prior is None and isinstance(inj.root, dict):
+        out = inj.root.get(S_DTOP)
+        if out is not UNDEF:
+            return out
+    if inj.key == S_DTOP and isinstance(inj.parent, dict):
+        out = inj.parent.get(S_DTOP)
+        if out is not UNDEF:
+            return out
     return val
 
 
+# Number of parameters of a command function, resolved once per function.
+def _numparams(fn):
+    try:
+        return _numparamsof(fn)
+    except TypeError:
+        # Unhashable callable, so not cached.
+        return _numparamsof.__wrapped__(fn)
+
+
+@functools.lru_cache(maxsize=256)
+def _numparamsof(fn):
+    try:
+        return len(inspect.signature(fn).parameters)
+    except (ValueError, TypeError):
+        return 4
+
+
+# Injection order of map keys: sorted, with transform keys last.
+# Sibling nodes (such as $EACH entries) usually share the same keys.
+@functools.lru_cache(maxsize=1024)
+def _nodekeys(keys):
+    normal_keys = []
+    transform_keys = []
+    for k in keys:
+        (transform_keys if S_DS in k else normal_keys).append(k)
+    normal_keys.sort()
+    transform_keys.sort()
+    return tuple(normal_keys + transform_keys)
+
+
+# True if any key or string in the node tree contains a backtick.
+# Results are memoized by id for the whole injection, holding the
+# node so that its id is not reused.
+def _hasinject(node, memo):
+    entry = memo.get(id(node))
+    if entry is not None and entry[0] is node:
+        return entry[1]
+
+    found = False
+    for (ckey, child) in (node.items() if isinstance(node, dict) else enumerate(node)):
+        if isinstance(ckey, str) and S_BT in ckey:
+            found = True
+        elif isinstance(child, str):
+            found = S_BT in child
+        elif isinstance(child, (dict, list)):
+            found = _hasinject(child, memo)
+        if found:
+            break
+
+    memo[id(node)] = (node, found)
+    return found
+
+
 # Default inject handler for transforms. If the path resolves to a function,
 # call the function passing the injection state. This is how transforms operate.
 def _injecthandler(inj, val, ref, store):
     out = val
-    iscmd = isfunc(val) and (UNDEF == ref or (isinstance(ref, str) and ref.startswith(S_DS)))
+    iscmd = isfunc(val) and (ref is UNDEF or (isinstance(ref, str) and ref.startswith(S_DS)))
 
     # Only call val function if it is a special command ($NAME format).
     if iscmd:
-        try:
-            num_params = len(inspect.signature(val).parameters)
-        except (ValueError, TypeError):
-            num_params = 4
-        if num_params >= 5:
+        if _numparams(val) >= 5:
             out = val(inj, val, inj.dparent, ref, store)
         else:
             out = val(inj, val, ref, store)
@@ -1581,8 +1899,10 @@ def transform_KEY(inj, val, ref, store):
 
     # If no explicit keyspec, and current data has a field matching this key,
     # use that value (common case: { k: '`$KEY`' } to pull dparent['k']).
-    if ismap(inj.dparent) and inj.key is not UNDEF and haskey(inj.dparent, inj.key):
-        return getprop(inj.dparent, inj.key)
+    if ismap(inj.dparent) and inj.key is not UNDEF:
+        out = getprop(inj.dparent, inj.key)
+        if out is not UNDEF:
+            return out
 
     meta = getprop(parent, S_BANNO)
     return getprop(meta, S_KEY, getprop(path, len(path) - 2))
@@ -1623,7 +1943,16 @@ def transform_MERGE(inj, val, ref, store):
 
         # Literals in the parent have precedence, but we still merge onto
         # the parent object, so that node tree references are not changed.
-        mergelist = [parent] + args + [clone(parent)]
+        # Only parent entries that the args can change in place need a
+        # copy to restore them; the rest are merged back onto themselves.
+        if isinstance(parent, dict) and all(isinstance(arg, dict) for arg in args):
+            literals = {
+                pkey: clone(pval) if any(pkey in arg for arg in args) else pval
+                for (pkey, pval) in parent.items()
+            }
+        else:
+            literals = clone(parent)
+        mergelist = [parent] + args + [literals]
 
         merge(mergelist)
 
@@ -1661,7 +1990,7 @@ def transform_EACH(inj, val, ref, store):
 
     # parent here is the array [ '$EACH', 'source-path', {... child ...} ]
     srcpath = parent[1] if len(parent) > 1 else UNDEF
-    child_template = clone(parent[2]) if len(parent) > 2 else UNDEF
+    child_template = parent[2] if len(parent) > 2 else UNDEF
 
     # Source data
     srcstore = getprop(store, inj.base, store)
@@ -1678,17 +2007,21 @@ def transform_EACH(inj, val, ref, store):
     rval = []
     
     if isnode(src):
-        if islist(src):
-            tval = [clone(child_template) for _ in src]
-        else:
-            # Convert dict to a list of child templates
+        if not isnode(child_template):
+            # Scalar templates are immutable, so can be shared.
+            tval = [child_template] * len(src)
+        elif islist(src):
+            tval = [_clone(child_template) for _ in src]
+        elif isinstance(child_template, dict):
+            # Convert dict to a list of child templates,
+            # keeping the key in meta for usage by `$KEY`.
             tval = []
-            for k, v in src.items():
-                # Keep key in meta for usage by `$KEY`
-                copy_child = clone(child_template)
-                if ismap(copy_child):
-                    setprop(copy_child, S_BANNO, {S_KEY: k})
+            for k in src:
+                copy_child = _clone(child_template)
+                copy_child[S_BANNO] = {S_KEY: k}
                 tval.append(copy_child)
+        else:
+            tval = [_clone(child_template) for _ in src]
         tcurrent = list(src.values()) if ismap(src) else src
         
         if 0 < size(tval):
@@ -1760,11 +2093,10 @@ def transform_PACK(inj, val, ref, store):
 
     if not islist(src):
         if ismap(src):
-            src_items = items(src)
             new_src = []
-            for item in src_items:
-                setprop(item[1], S_BANNO, {S_KEY: item[0]})
-                new_src.append(item[1])
+            for k, v in _itemiter(src):
+                setprop(v, S_BANNO, {S_KEY: k})
+                new_src.append(v)
             src = new_src
         else:
             src = UNDEF
@@ -1778,9 +2110,7 @@ def transform_PACK(inj, val, ref, store):
     child = getprop(childspec, S_BVAL, childspec)
 
     tval = {}
-    for item in items(src):
-        srckey = item[0]
-        srcnode = item[1]
+    for srckey, srcnode in _itemiter(src):
 
         k = srckey
         if keypath is not UNDEF:
@@ -1789,7 +2119,7 @@ def transform_PACK(inj, val, ref, store):
             else:
                 k = getpath(srcnode, keypath, inj)
 
-        tchild = clone(child)
+        tchild = _clone(child) if isnode(child) else child
         setprop(tval, k, tchild)
 
         anno = getprop(srcnode, S_BANNO)
@@ -1861,15 +2191,7 @@ def transform_REF(inj, val, _ref, store):
     ref = getpath(spec, refpath)
 
     # Check if ref has another $REF inside
-    hasSubRef = False
-    if isnode(ref):
-        def check_subref(k, v, parent, path):
-            nonlocal hasSubRef
-            if v == '`$REF`':
-                hasSubRef = True
-            return v
-
-        walk(ref, check_subref)
+    hasSubRef = isnode(ref) and _hasvalue(ref, '`$REF`')
 
     tref = clone(ref)
 
@@ -1905,6 +2227,22 @@ def transform_REF(inj, val, _ref, store):
     return val
 
 
+# True if the string sval is a value within node, to the depth that walk
+# visits. Stops at the first occurrence.
+def _hasvalue(node, sval):
+    stack = [(node, 0)]
+    while stack:
+        (cnode, depth) = stack.pop()
+        if MAXDEPTH <= depth + 1:
+            continue
+        for child in (cnode.values() if isinstance(cnode, dict) else cnode):
+            if isinstance(child, (dict, list)):
+                stack.append((child, depth + 1))
+            elif isinstance(child, str) and child == sval:
+                return True
+    return False
+
+
 def _fmt_number(_k, v, *_args):
     if isnode(v):
         return v
@@ -2038,7 +2376,7 @@ def transform_APPLY(inj, _val, _ref, store):
     apply_fn = err_apply_child[1]
     child = err_apply_child[2] if len(err_apply_child) > 2 else UNDEF
 
-    if UNDEF != err:
+    if err is not UNDEF:
         inj.errs.append('$' + ijname + ': ' + err)
         return UNDEF
 
@@ -2069,38 +2407,37 @@ def transform(
         spec,
         injdef=UNDEF
 ):
-    # Clone the spec so that the clone can be modified in place as the transform result.
+    return compile_spec(spec, injdef)(data)
+
+
+# Prepare a transform spec once, returning a function that transforms
+# data. Use this when the same spec is applied to many data values, as
+# the store of transform commands and any extra data and transforms are
+# only built once. The spec itself is still cloned for each call, as
+# injection modifies the clone in place to produce the result.
+def compile_spec(
+        spec,
+        injdef=UNDEF
+):
     origspec = spec
-    spec = clone(spec)
 
     extra = getprop(injdef, 'extra') if injdef else UNDEF
 
     collect = getprop(injdef, 'errs') is not None and getprop(injdef, 'errs') is not UNDEF if injdef else False
-    errs = getprop(injdef, 'errs') if collect else []
+    collecterrs = getprop(injdef, 'errs') if collect else UNDEF
 
     extraTransforms = {}
-    extraData = {} if UNDEF == extra else {}
+    extraData = {} if extra is UNDEF else {}
     
     if extra:
-        for k, v in items(extra):
+        for k, v in _itemiter(extra):
             if isinstance(k, str) and k.startswith(S_DS):
                 extraTransforms[k] = v
             else:
                 extraData[k] = v
 
-    # Combine extra data with user data
-    data_clone = merge([
-        clone(extraData) if not isempty(extraData) else UNDEF,
-        clone(data)
-    ])
-
-    # Top-level store used by inject
-    store = {
-        # The inject function recognises this special location for the root of the source data.
-        # NOTE: to escape data that contains "`$FOO`" keys at the top level,
-        # place that data inside a holding map: { myholder: mydata }.
-        S_DTOP: data_clone,
-
+    # Store entries that do not change between calls.
+    basestore = {
         # Original spec (before clone) for $REF to resolve refpath.
         S_DSPEC: lambda: origspec,
         
@@ -2126,31 +2463,65 @@ def transform(
 
         # Custom extra transforms, if any.
         **extraTransforms,
-
-        S_DERRS: errs,
     }
 
     if injdef is UNDEF or injdef is None:
         injdef = {}
     if not isinstance(injdef, dict):
         injdef = {}
-    injdef = {**injdef, 'errs': errs}
 
-    out = inject(spec, store, injdef)
+    # Top-level store used by inject, with the source data and errors
+    # set for each call.
+    storetpl = {
+        # The inject function recognises this special location for the root of the source data.
+        # NOTE: to escape data that contains "`$FOO`" keys at the top level,
+        # place that data inside a holding map: { myholder: mydata }.
+        S_DTOP: UNDEF,
 
-    generr = 0 < size(errs) and not collect
-    if generr:
-        raise ValueError(join(errs, ' | '))
+        **basestore,
 
-    return out
+        S_DERRS: UNDEF,
+    }
+
+    # A custom transform can replace the source data entry.
+    settop = S_DTOP not in basestore
+
+    def transformer(data):
+        errs = collecterrs if collect else []
+
+        # Combine extra data with user data
+        if isempty(extraData) and isinstance(data, dict):
+            # Copy and merge user data in a single pass.
+            data_clone = _mergeclone(data, 0)
+        else:
+            data_clone = merge([
+                clone(extraData) if not isempty(extraData) else UNDEF,
+                clone(data)
+            ])
+
+        # Copying the template keeps the entry order.
+        store = storetpl.copy()
+        if settop:
+            store[S_DTOP] = data_clone
+        store[S_DERRS] = errs
+
+        # Clone the spec so that the clone can be modified in place as the transform result.
+        out = inject(clone(origspec), store, {**injdef, 'errs': errs})
+
+        generr = 0 < size(errs) and not collect
+        if generr:
+            raise ValueError(join(errs, ' | '))
+
+        return out
+
+    return transformer
 
 
 def validate_STRING(inj, _val=UNDEF, _ref=UNDEF, _store=UNDEF):
     out = getprop(inj.dparent, inj.key)
-    t = typify(out)
 
-    if 0 == (T_string & t):
-        inj.errs.append(_invalidTypeMsg(inj.path, S_string, t, out, 'V1010'))
+    if not isinstance(out, str):
+        inj.errs.append(_invalidTypeMsg(inj.path, S_string, typify(out), out, 'V1010'))
         return UNDEF
 
     if S_MT == out:
@@ -2175,11 +2546,18 @@ TYPE_CHECKS = {
 }
 
 
-def validate_TYPE(inj, _val=UNDEF, ref=UNDEF, _store=UNDEF):
-    tname = slice(ref, 1).lower() if isinstance(ref, str) and len(ref) > 1 else S_any
-    typev = 1 << (31 - TYPENAME.index(tname)) if tname in TYPENAME else 0
+# Type name and flags required by a type command reference such as $NUMBER.
+@functools.lru_cache(maxsize=256)
+def _typeref(ref):
+    tname = ref[1:].lower() if isinstance(ref, str) and len(ref) > 1 else S_any
+    typev = _TYPEFLAG.get(tname, 0)
     if tname == S_nil:
         typev = typev | T_null
+    return tname, typev
+
+
+def validate_TYPE(inj, _val=UNDEF, ref=UNDEF, _store=UNDEF):
+    tname, typev = _typeref(ref)
     out = getprop(inj.dparent, inj.key)
     t = typify(out)
 
@@ -2191,10 +2569,13 @@ def validate_TYPE(inj, _val=UNDEF, ref=UNDEF, _store=UNDEF):
 
 
 def validate_ANY(inj, _val=UNDEF, _ref=UNDEF, _store=UNDEF):
-    return getprop(inj.dparent, inj.key)
+    dparent = inj.dparent
+    if isinstance(dparent, dict):
+        return dparent.get(inj.key)
+    return getprop(dparent, inj.key)
 
 
-def validate_CHILD(inj, _val=UNDEF, _ref=UNDEF, _store=UNDEF):
+def validate_CHILD(inj, _val=UNDEF, _ref=UNDEF, store=UNDEF):
     mode = inj.mode
     key = inj.key
     parent = inj.parent
@@ -2208,17 +2589,28 @@ def validate_CHILD(inj, _val=UNDEF, _ref=UNDEF, _store=UNDEF):
         pkey = getelem(path, -2)
         tval = getprop(inj.dparent, pkey)
 
-        if UNDEF == tval:
+        if tval is UNDEF:
             tval = {}
         elif not ismap(tval):
             inj.errs.append(_invalidTypeMsg(
                 path[:-1], S_object, typify(tval), tval, 'V0220'))
             return UNDEF
 
+        # Scalar templates are immutable, so only node templates are cloned,
+        # and a scalar template can be set for all keys in one update.
         ckeys = keysof(tval)
-        for ckey in ckeys:
-            setprop(parent, ckey, clone(childtm))
-            keys.append(ckey)
+        if isnode(childtm):
+            if isinstance(parent, dict):
+                parent.update(zip(ckeys, _clonemany(childtm, len(ckeys))))
+            else:
+                for ckey in ckeys:
+                    setprop(parent, ckey, _clone(childtm))
+        elif childtm is not UNDEF and isinstance(parent, dict):
+            parent.update(dict.fromkeys(ckeys, childtm))
+        else:
+            for ckey in ckeys:
+                setprop(parent, ckey, childtm)
+        keys.extend(ckeys)
 
         inj.setval(UNDEF)
         return UNDEF
@@ -2231,29 +2623,121 @@ def validate_CHILD(inj, _val=UNDEF, _ref=UNDEF, _store=UNDEF):
             return UNDEF
 
         childtm = getprop(parent, 1)
+        current = inj.dparent
 
-        if UNDEF == inj.dparent:
+        if current is UNDEF:
             del parent[:]
             return UNDEF
 
-        if not islist(inj.dparent):
+        if not isinstance(current, list):
             msg = _invalidTypeMsg(
-                path[:-1], S_list, typify(inj.dparent), inj.dparent, 'V0230')
+                path[:-1], S_list, typify(current), current, 'V0230')
             inj.errs.append(msg)
             inj.keyI = size(parent)
-            return inj.dparent
-
-        for n in items(inj.dparent):
-            setprop(parent, n[0], clone(childtm))
-        del parent[len(inj.dparent):]
+            return current
+
+        # A list of valid scalars against a type command template needs
+        # no per entry injection; the entries are the result.
+        if isinstance(childtm, str) and _childscalars(childtm, current, store):
+            parent[:] = current
+            inj.keyI = len(parent)
+            return getprop(current, 0)
+
+        if isnode(childtm):
+            parent[:] = _clonemany(childtm, len(current))
+        elif childtm is not UNDEF:
+            parent[:] = [childtm] * len(current)
+        else:
+            # A null template deletes entries, as setprop does.
+            for cI in range(len(current)):
+                setprop(parent, cI, childtm)
+            del parent[len(current):]
         inj.keyI = 0
 
-        out = getprop(inj.dparent, 0)
+        out = getprop(current, 0)
         return out
 
     return UNDEF
 
 
+# True if the $ONE alternative tval certainly fails to validate
+# current, judged by top level type alone. False if unsure.
+def _onemismatch(tval, current, store):
+    if current is UNDEF:
+        return False
+
+    if isinstance(tval, str):
+        m = R_CMD_NAME.fullmatch(tval)
+        if m is None:
+            # Path references (such as "`a.b`") are unsure until injected.
+            if S_BT in tval or S_DS in tval:
+                return False
+            return not isinstance(current, str)
+        cmd = getprop(store, S_DS + m.group(1))
+        if cmd is validate_STRING:
+            return not isinstance(current, str)
+        if cmd is validate_TYPE:
+            return 0 == (typify(current) & _typeref(S_DS + m.group(1))[1])
+        return False
+
+    if isinstance(tval, dict):
+        if not isinstance(current, dict):
+            return True
+
+        # Tagged unions: a key with an $EXACT list of plain scalars rules
+        # out the alternative if the data has none of those values.
+        if getprop(store, '$EXACT') is validate_EXACT:
+            for (tkey, tchild) in tval.items():
+                if (isinstance(tchild, list) and 1 < len(tchild) and
+                        S_BEXACT == tchild[0] and _plainscalars(tchild)):
+                    cchild = current.get(tkey)
+                    if not any(tchild[tI] == cchild for tI in range(1, len(tchild))):
+                        return True
+        return False
+
+    if isinstance(tval, list):
+        t0 = tval[0] if 0 < len(tval) else UNDEF
+        if isinstance(t0, str) and S_DS in t0:
+            return False
+        return not isinstance(current, list)
+
+    if isinstance(tval, (bool, int, float)):
+        return typify(tval) != typify(current)
+
+    return False
+
+
+# True if the values after the command in a spec list are scalars that
+# are compared as given, without injection.
+def _plainscalars(tlist):
+    for tI in range(1, len(tlist)):
+        ev = tlist[tI]
+        if isinstance(ev, str):
+            if S_BT in ev:
+                return False
+        elif ev is not None and not isinstance(ev, (bool, int, float)):
+            return False
+    return True
+
+
+# True if every entry of the list current is a non-null scalar that
+# certainly passes the type command template childtm.
+def _childscalars(childtm, current, store):
+    m = R_CMD_NAME.fullmatch(childtm)
+    if m is None:
+        return False
+
+    cmd = getprop(store, S_DS + m.group(1))
+    if cmd is validate_STRING:
+        return all(isinstance(c, str) and S_MT != c for c in current)
+
+    if cmd is validate_TYPE:
+        typev = _typeref(S_DS + m.group(1))[1]
+        return all(c is not None and 0 != (typify(c) & typev) for c in current)
+
+    return False
+
+
 def validate_ONE(inj, _val=UNDEF, _ref=UNDEF, store=UNDEF):
     mode = inj.mode
     parent = inj.parent
@@ -2273,39 +2757,79 @@ def validate_ONE(inj, _val=UNDEF, _ref=UNDEF, store=UNDEF):
         inj.path = inj.path[:-1]
         inj.key = getelem(inj.path, -1)
 
-        tvals = parent[1:]
-        if 0 == size(tvals):
+        # The alternatives follow the command in parent.
+        lasttI = len(parent) - 1
+        if 0 == lasttI:
             inj.errs.append('The $ONE validator at field ' +
                             pathify(inj.path, 1, 1) +
                             ' must have at least one argument.')
             return None
 
-        for tval in tvals:
-            terrs = []
+        dparent = inj.dparent
+        meta = inj.meta
+
+        # Where an alternative's result is set (as by inj.setval) does
+        # not change between alternatives.
+        okey = inj.key
 
-            vstore = merge([{}, store], 1)
-            vstore[S_DTOP] = inj.dparent
+        # The store is the same for each alternative.
+        vstore = merge([{}, store], 1)
+        vstore[S_DTOP] = dparent
+
+        for tI in range(1, lasttI + 1):
+            tval = parent[tI]
+            last = tI == lasttI
+
+            # A failed alternative only sets a value that a later
+            # alternative replaces, so before the last alternative,
+            # certain failures are skipped, and validation stops at
+            # the first error, as the messages are discarded.
+            if not last and _onemismatch(tval, dparent, store):
+                continue
+
+            terrs = []
 
-            vcurrent = validate(inj.dparent, tval, {
+            vdef = {
                 'extra': vstore,
                 'errs': terrs,
-                'meta': inj.meta,
-            })
+                'meta': meta,
+            }
+            if not last:
+                vdef['maxerrs'] = 1
 
-            inj.setval(vcurrent, -2)
+            vcurrent = validate(dparent, tval, vdef)
 
-            if 0 == size(terrs):
+            if 0 == len(terrs):
+                setprop(parent, okey, vcurrent)
                 return None
 
-        valdesc = ', '.join(stringify(n[1]) for n in items(tvals))
-        valdesc = re.sub(r'`\$([A-Z]+)`', lambda m: m.group(1).lower(), valdesc)
+            if last:
+                # Described first, as the result may replace an alternative.
+                valdesc = _valdesc(parent)
+                setprop(parent, okey, vcurrent)
 
         inj.errs.append(_invalidTypeMsg(
             inj.path,
-            ('one of ' if 1 < size(tvals) else '') + valdesc,
+            ('one of ' if 1 < lasttI else '') + valdesc,
             typify(inj.dparent), inj.dparent, 'V0210'))
 
 
+# Describe the spec values after a command for error messages, naming
+# commands by type.
+def _valdesc(parent):
+    valdesc = ', '.join(stringify(parent[tI]) for tI in range(1, len(parent)))
+    if S_BT not in valdesc:
+        return valdesc
+    return _cmdnames(valdesc)
+
+
+# The same alternatives are usually described for every failing data
+# value, so the command names are replaced once per description.
+@functools.lru_cache(maxsize=256)
+def _cmdnames(valdesc):
+    return R_CMD_NAME.sub(lambda m: m.group(1).lower(), valdesc)
+
+
 def validate_EXACT(inj, _val=UNDEF, _ref=UNDEF, _store=UNDEF):
     mode = inj.mode
     parent = inj.parent
@@ -2326,32 +2850,33 @@ def validate_EXACT(inj, _val=UNDEF, _ref=UNDEF, _store=UNDEF):
         inj.path = inj.path[:-1]
         inj.key = getelem(inj.path, -1)
 
-        tvals = parent[1:]
-        if 0 == size(tvals):
+        numvals = len(parent) - 1
+        if 0 == numvals:
             inj.errs.append('The $EXACT validator at field ' +
                 pathify(inj.path, 1, 1) +
                 ' must have at least one argument.')
             return None
 
+        dparent = inj.dparent
         currentstr = None
-        for tval in tvals:
-            exactmatch = tval == inj.dparent
+        for tI in range(1, numvals + 1):
+            tval = parent[tI]
+            exactmatch = tval == dparent
 
             if not exactmatch and isnode(tval):
-                currentstr = stringify(inj.dparent) if currentstr is None else currentstr
+                currentstr = stringify(dparent) if currentstr is None else currentstr
                 tvalstr = stringify(tval)
                 exactmatch = tvalstr == currentstr
 
             if exactmatch:
                 return None
 
-        valdesc = ', '.join(stringify(n[1]) for n in items(tvals))
-        valdesc = re.sub(r'`\$([A-Z]+)`', lambda m: m.group(1).lower(), valdesc)
+        valdesc = _valdesc(parent)
 
         inj.errs.append(_invalidTypeMsg(
             inj.path,
             ('' if 1 < size(inj.path) else 'value ') +
-            'exactly equal to ' + ('' if 1 == size(tvals) else 'one of ') + valdesc,
+            'exactly equal to ' + ('' if 1 == numvals else 'one of ') + valdesc,
             typify(inj.dparent), inj.dparent, 'V0110'))
     else:
         delprop(parent, key)
@@ -2363,57 +2888,69 @@ def _validation(
         parent,
         inj
 ):
-    if UNDEF == inj:
+    if inj is UNDEF:
         return
 
-    if pval == SKIP:
+    # Strings with commands are checked by their validators. Neither
+    # check depends on the data, so both are made before it is read.
+    if isinstance(pval, str):
+        if S_DS in pval:
+            return
+    elif pval == SKIP:
         return
 
     # select needs exact matches
-    exact = getprop(inj.meta, S_BEXACT, False)
+    exact = inj.meta.get(S_BEXACT, False)
 
     # Current val to verify.
-    cval = getprop(inj.dparent, key)
+    dparent = inj.dparent
+    if isinstance(dparent, dict) and isinstance(key, str):
+        cval = dparent.get(key)
+    else:
+        cval = getprop(dparent, key)
 
-    if UNDEF == inj or (not exact and UNDEF == cval):
+    if not exact and cval is UNDEF:
         return
 
     ptype = typify(pval)
-
-    if 0 < (T_string & ptype) and S_DS in str(pval):
-        return
-
     ctype = typify(cval)
 
-    if ptype != ctype and UNDEF != pval:
+    if ptype != ctype and pval is not UNDEF:
         inj.errs.append(_invalidTypeMsg(inj.path, typename(ptype), ctype, cval, 'V0010'))
         return
 
-    if ismap(cval):
-        if not ismap(pval):
+    # The type flags already distinguish maps and lists, so the branches
+    # test those rather than checking instances again.
+    if ctype & T_map:
+        if 0 == (ptype & T_map):
             inj.errs.append(_invalidTypeMsg(inj.path, typename(ptype), ctype, cval, 'V0020'))
             return
 
-        ckeys = keysof(cval)
-        pkeys = keysof(pval)
-
         # Empty spec object {} means object can be open (any keys).
-        if 0 < len(pkeys) and True != getprop(pval, '`$OPEN`'):
-            badkeys = []
-            for ckey in ckeys:
-                if not haskey(pval, ckey):
-                    badkeys.append(ckey)
-            if 0 < size(badkeys):
+        if 0 < len(pval) and True != pval.get(S_BOPEN):
+            # Key sets are compared directly, unless null spec values
+            # must also be treated as missing.
+            if None in pval.values():
+                badkeys = sorted(ckey for ckey in cval if pval.get(ckey) is UNDEF)
+            else:
+                badkeys = sorted(cval.keys() - pval.keys())
+            if 0 < len(badkeys):
                 msg = 'Unexpected keys at field ' + pathify(inj.path, 1) + S_VIZ + join(badkeys, ', ')
                 inj.errs.append(msg)
         else:
-            # Object is open, so merge in extra keys.
-            merge([pval, cval])
-            if isnode(pval):
-                delprop(pval, '`$OPEN`')
+            # Object is open, so merge in extra keys. The spec is a per
+            # call clone, so the open marker is removed directly. Plain
+            # scalar entries are set in merge order, without a merge.
+            if all(isinstance(ckey, str) and child is not None and
+                   not isinstance(child, (dict, list))
+                   for (ckey, child) in cval.items()):
+                pval.update(sorted(cval.items()))
+            else:
+                _mergenode(pval, cval, 0, MAXDEPTH)
+            pval.pop(S_BOPEN, None)
 
-    elif islist(cval):
-        if not islist(pval):
+    elif ctype & T_list:
+        if 0 == (ptype & T_list):
             inj.errs.append(_invalidTypeMsg(inj.path, typename(ptype), ctype, cval, 'V0030'))
 
     elif exact:
@@ -2424,7 +2961,10 @@ def _validation(
 
     else:
         # Spec value was a default, copy over data
-        setprop(parent, key, cval)
+        if isinstance(parent, dict) and isinstance(key, str):
+            parent[key] = cval
+        else:
+            setprop(parent, key, cval)
 
     return
 
@@ -2440,61 +2980,224 @@ def _validation(
 # validates {a:'A'} but not {a:1}. Empty map or list means the node
 # is open, and if missing an empty default is inserted.
 def validate(data, spec, injdef=UNDEF):
+    # Specs are not cached between calls, as they may be changed by the
+    # caller. Use compile_validator to reuse a spec for many data values.
+    return compile_validator(spec, injdef)(data)
+
+
+# Validation commands. Transform commands that make no sense when
+# validating are disabled.
+_VALIDATE_STORE = {
+    "$DELETE": None,
+    "$COPY": None,
+    "$KEY": None,
+    "$META": None,
+    "$MERGE": None,
+    "$EACH": None,
+    "$PACK": None,
+
+    "$STRING": validate_STRING,
+    "$NUMBER": validate_TYPE,
+    "$INTEGER": validate_TYPE,
+    "$DECIMAL": validate_TYPE,
+    "$BOOLEAN": validate_TYPE,
+    "$NULL": validate_TYPE,
+    "$NIL": validate_TYPE,
+    "$MAP": validate_TYPE,
+    "$LIST": validate_TYPE,
+    "$FUNCTION": validate_TYPE,
+    "$INSTANCE": validate_TYPE,
+    "$ANY": validate_ANY,
+    "$CHILD": validate_CHILD,
+    "$ONE": validate_ONE,
+    "$EXACT": validate_EXACT,
+}
+
+
+# Prepare a validation spec once, returning a function that validates
+# data. Use this when the same spec is applied to many data values, as
+# the store of validation commands and the underlying transform are
+# only built once. The spec must not be changed after compiling.
+def compile_validator(spec, injdef=UNDEF):
     extra = getprop(injdef, 'extra')
 
     collect = getprop(injdef, 'errs') is not None and getprop(injdef, 'errs') is not UNDEF
-    errs = getprop(injdef, 'errs') if collect else []
     
-    store = merge([
-        {
-            "$DELETE": None,
-            "$COPY": None,
-            "$KEY": None,
-            "$META": None,
-            "$MERGE": None,
-            "$EACH": None,
-            "$PACK": None,
-
-            "$STRING": validate_STRING,
-            "$NUMBER": validate_TYPE,
-            "$INTEGER": validate_TYPE,
-            "$DECIMAL": validate_TYPE,
-            "$BOOLEAN": validate_TYPE,
-            "$NULL": validate_TYPE,
-            "$NIL": validate_TYPE,
-            "$MAP": validate_TYPE,
-            "$LIST": validate_TYPE,
-            "$FUNCTION": validate_TYPE,
-            "$INSTANCE": validate_TYPE,
-            "$ANY": validate_ANY,
-            "$CHILD": validate_CHILD,
-            "$ONE": validate_ONE,
-            "$EXACT": validate_EXACT,
-        },
-
-        ({} if extra is UNDEF or extra is None else extra),
-
-        {
-            "$ERRS": errs,
-        }
-    ], 1)
+    store = _VALIDATE_STORE if extra is UNDEF or extra is None else \
+        merge([dict(_VALIDATE_STORE), extra], 1)
+
+    # Specs of closed maps, scalar defaults and type commands are checked
+    # directly, falling back to the full transform for anything else.
+    plain = UNDEF
+    if (extra is UNDEF or extra is None) and getprop(injdef, 'meta') is UNDEF:
+        plain = _plainvalidator(spec)
 
     meta = getprop(injdef, 'meta', {})
     setprop(meta, S_BEXACT, getprop(meta, S_BEXACT, False))
 
-    out = transform(data, spec, {
+    tdef = {
         'meta': meta,
         'extra': store,
         'modify': _validation,
         'handler': _validatehandler,
-        'errs': errs,
-    })
+    }
 
-    generr = 0 < len(errs) and not collect
-    if generr:
-        raise ValueError(' | '.join(errs))
+    validator = _fullvalidator(spec, tdef, injdef, collect)
+    if plain is UNDEF:
+        return validator
 
-    return out
+    def plainvalidator(data):
+        out = plain(data)
+        return validator(data) if out is _PLAIN_MISS else out
+
+    return plainvalidator
+
+
+def _fullvalidator(spec, tdef, injdef, collect):
+    # If errors are not collected, the transform raises them, using a
+    # new error list for each call.
+    if not collect:
+        return compile_spec(spec, tdef)
+
+    tdef['errs'] = getprop(injdef, 'errs')
+
+    # Optionally stop validating once enough errors are collected, in
+    # which case the validator returns UNDEF.
+    maxerrs = getprop(injdef, 'maxerrs')
+    if maxerrs is UNDEF:
+        return compile_spec(spec, tdef)
+
+    def modify(pval, key, parent, inj):
+        _validation(pval, key, parent, inj)
+        if maxerrs <= len(inj.errs):
+            raise _ValidationLimit()
+
+    tdef['modify'] = modify
+    transformer = compile_spec(spec, tdef)
+
+    def validator(data):
+        try:
+            return transformer(data)
+        except _ValidationLimit:
+            return UNDEF
+
+    return validator
+
+
+# Returned by a plain validator for data that it cannot fully validate.
+_PLAIN_MISS = object()
+
+# Type commands checked directly by plain validators.
+_PLAIN_TYPES = ('$NUMBER', '$INTEGER', '$DECIMAL', '$BOOLEAN', '$MAP', '$LIST')
+
+
+def _plainvalidator(spec):
+    # Compile a spec made only of non-empty closed maps, scalar defaults,
+    # and the string, any and simple type commands, into a function that
+    # builds the validated output directly. Missing required values,
+    # wrong types, unexpected keys and nulls in the data all return
+    # _PLAIN_MISS, so that the full transform reports them. Returns UNDEF
+    # if the spec uses anything else.
+    if not isinstance(spec, dict) or 0 == len(spec):
+        return UNDEF
+
+    fields = []
+    for (key, sval) in spec.items():
+        if not isinstance(key, str) or S_DS in key or S_BT in key:
+            return UNDEF
+
+        if isinstance(sval, dict):
+            check = _plainvalidator(sval)
+            if check is UNDEF:
+                return UNDEF
+            fields.append((key, S_map, check))
+
+        elif isinstance(sval, str) and S_BT in sval:
+            ref = sval[1:-1] if 2 < len(sval) and sval[0] == S_BT and sval[-1] == S_BT else S_MT
+            if '$STRING' == ref or '$ANY' == ref:
+                fields.append((key, ref, UNDEF))
+            elif ref in _PLAIN_TYPES:
+                fields.append((key, S_DS, _typeref(ref)[1]))
+            else:
+                return UNDEF
+
+        elif isinstance(sval, str) and S_DS in sval:
+            # Left in place by the full transform, whatever the data.
+            return UNDEF
+
+        elif isinstance(sval, (str, int, float)) and T_noval != typify(sval):
+            fields.append((key, S_MT, (sval, typify(sval))))
+
+        else:
+            return UNDEF
+
+    keyset = frozenset(spec)
+
+    # Data nodes are copied as the transform copies its data, at the same
+    # depth, so keys are in the same sorted order.
+    def check(data, depth=0):
+        if not isinstance(data, dict):
+            return _PLAIN_MISS
+
+        for dkey in data:
+            if dkey not in keyset:
+                return _PLAIN_MISS
+
+        cdepth = depth + 1
+        out = {}
+        for (key, kind, arg) in fields:
+            val = data.get(key)
+            if val is UNDEF and key in data:
+                return _PLAIN_MISS
+
+            if S_map == kind:
+                val = arg({} if val is UNDEF else val, cdepth)
+                if val is _PLAIN_MISS:
+                    return _PLAIN_MISS
+
+            elif S_MT == kind:
+                if val is UNDEF:
+                    val = arg[0]
+                elif typify(val) != arg[1]:
+                    return _PLAIN_MISS
+
+            elif '$STRING' == kind:
+                if not isinstance(val, str) or S_MT == val:
+                    return _PLAIN_MISS
+
+            elif '$ANY' == kind:
+                if val is UNDEF:
+                    continue
+                if isinstance(val, (dict, list)):
+                    if _hasnull(val):
+                        return _PLAIN_MISS
+                    val = _mergeclonechild(val, cdepth, cdepth < MAXDEPTH)
+
+            elif val is UNDEF or 0 == (typify(val) & arg) or _hasnull(val):
+                return _PLAIN_MISS
+
+            elif isinstance(val, (dict, list)):
+                val = _mergeclonechild(val, cdepth, cdepth < MAXDEPTH)
+
+            out[key] = val
+
+        return out
+
+    return check
+
+
+def _hasnull(val):
+    # Nulls inside data nodes are removed by injection, so a plain
+    # validator leaves such data to the full transform.
+    if isinstance(val, dict):
+        return any(child is None or _hasnull(child) for child in val.values())
+    if isinstance(val, list):
+        return any(child is None or _hasnull(child) for child in val)
+    return False
+
+
+class _ValidationLimit(Exception):
+    "Raised to stop validation once the maximum number of errors is reached."
 
 
 
@@ -2533,6 +3236,55 @@ def _updateAncestors(_state, target, tkey, tval):
     setprop(target, tkey, tval)
 
 
+# Resolve one partial injection within a string, returning a string.
+def _injectpart(mobj, store, inj):
+    ref = mobj.group(1)
+
+    # Special escapes inside injection.
+    if 3 < len(ref):
+        ref = _injectesc(ref)
+        
+    if inj is not UNDEF:
+        inj.full = False
+
+    found = getpath(store, ref, inj)
+    
+    # Ensure inject value is a string.
+    if found is UNDEF:
+        return S_MT
+        
+    if isinstance(found, str):
+        # Convert test NULL marker to JSON 'null' when injecting into strings
+        if found == '__NULL__':
+            return 'null'
+        return found
+        
+    # Common scalars are formatted as json.dumps would.
+    ftype = type(found)
+    if ftype is bool:
+        return 'true' if found else 'false'
+    if ftype is int or (ftype is float and math.isfinite(found)):
+        return repr(found)
+
+    if isfunc(found):
+        return found
+
+    try:
+        return json.dumps(found, separators=(',', ':'))
+    except (TypeError, ValueError):
+        return stringify(found)
+
+
+# Replace the $BT and $DS escapes in a single pass.
+_INJECT_ESC = {'BT': S_BT, 'DS': S_DS}
+
+
+def _injectesc(ref):
+    if S_DS not in ref:
+        return ref
+    return R_INJECT_ESC.sub(lambda m: _INJECT_ESC[m.group(1)], ref)
+
+
 # Inject values from a data store into a string. Not a public utility - used by
 # `inject`.  Inject are marked with `path` where path is resolved
 # with getpath against the store or current (if defined)
@@ -2544,27 +3296,25 @@ def _updateAncestors(_state, target, tkey, tval):
 # optionally allows transforms to be ordered by alphanumeric sorting.
 def _injectstr(val, store, inj=UNDEF):
     # Can't inject into non-strings
-    full_re = re.compile(r'^`(\$[A-Z]+|[^`]*)[0-9]*`$')
-    part_re = re.compile(r'`([^`]*)`')
-
     if not isinstance(val, str) or S_MT == val:
         return S_MT
 
     out = val
     
     # Pattern examples: "`a.b.c`", "`$NAME`", "`$NAME1`"
-    m = full_re.match(val)
+    # Most strings and keys have no injections, so skip the patterns.
+    m = R_INJECT_FULL.match(val) if S_BT in val else None
     
     # Full string of the val is an injection.
     if m:
-        if UNDEF != inj:
+        if inj is not UNDEF:
             inj.full = True
 
         pathref = m.group(1)
 
         # Special escapes inside injection.
         if 3 < len(pathref):
-            pathref = pathref.replace(r'$BT', S_BT).replace(r'$DS', S_DS)
+            pathref = _injectesc(pathref)
 
         # Get the extracted path reference.
         out = getpath(store, pathref, inj)
@@ -2572,43 +3322,15 @@ def _injectstr(val, store, inj=UNDEF):
     else:
         
         # Check for injections within the string.
-        def partial(mobj):
-            ref = mobj.group(1)
-
-            # Special escapes inside injection.
-            if 3 < len(ref):
-                ref = ref.replace(r'$BT', S_BT).replace(r'$DS', S_DS)
-                
-            if UNDEF != inj:
-                inj.full = False
-
-            found = getpath(store, ref, inj)
-            
-            # Ensure inject value is a string.
-            if UNDEF == found:
-                return S_MT
-                
-            if isinstance(found, str):
-                # Convert test NULL marker to JSON 'null' when injecting into strings
-                if found == '__NULL__':
-                    return 'null'
-                return found
-                
-            if isfunc(found):
-                return found
-
-            try:
-                return json.dumps(found, separators=(',', ':'))
-            except (TypeError, ValueError):
-                return stringify(found)
-
-        out = part_re.sub(partial, val)
+        if S_BT in val:
+            out = R_INJECT_PART.sub(functools.partial(_injectpart, store=store, inj=inj), val)
 
         # Also call the inj handler on the entire string, providing the
         # option for custom injection.
-        if UNDEF != inj and isfunc(inj.handler):
+        handler = UNDEF if inj is UNDEF else inj.handler
+        if callable(handler):
             inj.full = True
-            out = inj.handler(inj, out, val, store)
+            out = handler(inj, out, val, store)
 
     return out
 
@@ -2616,18 +3338,29 @@ def _injectstr(val, store, inj=UNDEF):
 def _invalidTypeMsg(path, needtype, vt, v, _whence=None):
     vs = 'no value' if v is None or v is UNDEF else stringify(v)
     return (
-        'Expected ' +
-        ('field ' + pathify(path, 1) + ' to be ' if 1 < size(path) else '') +
-        str(needtype) + ', but found ' +
+        _invalidTypePrefix(tuple(path), str(needtype)) +
         (typename(vt) + S_VIZ if v is not None and v is not UNDEF else '') + vs +
         '.'
     )
 
 
+# The field and expected type part of the message repeats across
+# failing $ONE alternatives and sibling entries, so it is cached.
+@functools.lru_cache(maxsize=1024)
+def _invalidTypePrefix(path, needtype):
+    return (
+        'Expected ' +
+        ('field ' + pathify(list(path), 1) + ' to be ' if 1 < len(path) else '') +
+        needtype + ', but found '
+    )
+
+
 # Create a StructUtils class with all utility functions as attributes
 class StructUtility:
     def __init__(self):
         self.clone = clone
+        self.compile_spec = compile_spec
+        self.compile_validator = compile_validator
         self.delprop = delprop
         self.escre = escre
         self.escurl = escurl
@@ -2701,6 +3434,8 @@ __all__ = [
     'StructUtility',
     'checkPlacement',
     'clone',
+    'compile_spec',
+    'compile_validator',
     'delprop',
     'escre',
     'escurl',